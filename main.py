@@ -1,7 +1,11 @@
 from __future__ import annotations
-import os, time, asyncio, logging, traceback, json, html
+import os, time, asyncio, logging, traceback, json, html, copy, heapq, zlib, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, Tuple, List, Optional
 import aiohttp
+from aiohttp import web
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
 from decimal import Decimal, ROUND_HALF_UP  # <-- tambah untuk pembulatan presisi
@@ -12,8 +16,27 @@ ALLOWED_USERS = [int(x.strip()) for x in ALLOWED_IDS.split(",") if x.strip().isd
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN belum diset di environment.")
 
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()   # polling | webhook
+PORT = int(os.getenv("PORT", "8080"))                           # Railway menyediakan PORT otomatis
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+if not WEBHOOK_URL and os.getenv("RAILWAY_PUBLIC_DOMAIN"):
+    WEBHOOK_URL = f"https://{os.getenv('RAILWAY_PUBLIC_DOMAIN').strip()}"
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip().strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+# 0 = jangan panggil setWebhook (uji lokal/replay payload); webhook bot live tidak disentuh
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1").strip().lower() not in ("0", "false", "no")
+# jumlah update yg diproses paralel; 1..100 (batas max_connections setWebhook Telegram)
+UPDATE_CONCURRENCY = min(max(int(os.getenv("UPDATE_CONCURRENCY", "8")), 1), 100)
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise RuntimeError("BOT_MODE=webhook butuh WEBHOOK_SECRET.")
+if BOT_MODE == "webhook" and WEBHOOK_REGISTER and not WEBHOOK_URL:
+    raise RuntimeError("BOT_MODE=webhook butuh WEBHOOK_URL (atau RAILWAY_PUBLIC_DOMAIN), atau WEBHOOK_REGISTER=0 utk uji lokal.")
+
 HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "12"))
 ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "8"))
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "0"))   # >1 = scan dibagi ke N proses worker (shard)
+
+KLINE_LIMIT = 120   # window klines per TF; satu ukuran per (symbol, interval) agar cache & state indikator dipakai bersama
 
 THRESHOLD_RETAIL = float(os.getenv("THRESHOLD_RETAIL", "2.7"))
 THRESHOLD_PRO    = float(os.getenv("THRESHOLD_PRO", "3.7"))
@@ -24,6 +47,15 @@ FEE_PCT_PER_SIDE = float(os.getenv("FEE_PCT_PER_SIDE", "0.001"))    # 0.1% per s
 SLIPPAGE_PCT     = float(os.getenv("SLIPPAGE_PCT", "0.0002"))       # 0.02%
 MIN_NET_TP1_PCT  = float(os.getenv("MIN_NET_TP1_PCT", "0.25"))      # ambang net min utk TP1 (%)
 
+TRACK_INTERVAL_SEC = int(os.getenv("TRACK_INTERVAL_SEC", "30"))     # interval cek TP/SL sinyal terbuka
+SIGNAL_TTL_HOURS   = float(os.getenv("SIGNAL_TTL_HOURS", "48"))     # sinyal kadaluarsa jika belum kena TP2/SL
+
+DELIVERY_MODE      = os.getenv("DELIVERY_MODE", "batch").strip().lower()  # batch | single
+TG_GLOBAL_RPS      = float(os.getenv("TG_GLOBAL_RPS", "25"))        # batas global Bot API (limit Telegram ~30/s)
+TG_CHAT_INTERVAL   = float(os.getenv("TG_CHAT_INTERVAL", "0.4"))    # jeda minimal antar pesan ke chat yg sama
+TG_MAX_LEN         = int(os.getenv("TG_MAX_LEN", "4000"))           # di bawah limit 4096 karakter Telegram
+PROGRESS_EDIT_SEC  = float(os.getenv("PROGRESS_EDIT_SEC", "3"))     # interval edit pesan progres scan
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
 log = logging.getLogger("signal-bot-enhanced")
 
@@ -39,12 +71,6 @@ PAIRS = [
     "IOTAUSDT","JASMYUSDT","RAYUSDT","GALAUSDT","DEXEUSDT","SANDUSDT","PENDLEUSDT"
 ]
 
-STRATEGIES: Dict[str, Dict[str, float]] = {
-    "🔴 Jemput Bola": {"rsi_limit": 40, "volume_min_usd": 1_000_000},
-    "🟡 Rebound Swing": {"rsi_limit": 50, "volume_min_usd": 1_500_000},
-    "🟢 Scalping Breakout": {"rsi_limit": 60, "volume_min_usd": 3_000_000},
-}
-
 TF_INTERVALS: Dict[str, str] = {"TF15": "15m", "TF1h": "1h", "TF4h": "4h"}
 SR_WINDOW = {"15m": 30, "1h": 50, "4h": 80}
 
@@ -65,86 +91,13 @@ def kb_main() -> ReplyKeyboardMarkup:
 
 def kb_mode() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
-        [["🔴 Jemput Bola"],["🟡 Rebound Swing"],["🟢 Scalping Breakout"],["⬅️ Kembali"]],
+        [[name] for name in COMPILED_STRATEGIES] + [["⬅️ Kembali"]],
         resize_keyboard=True
     )
 
-def ema_series(values: List[float], period: int) -> List[float]:
-    if len(values) < period: return []
-    k = 2 / (period + 1)
-    out = [sum(values[:period]) / period]
-    for v in values[period:]:
-        out.append((v - out[-1]) * k + out[-1])
-    return out
-
-def rsi_series(closes: List[float], period: int = 14) -> List[float]:
-    if len(closes) < period + 1: return []
-    deltas = [closes[i+1] - closes[i] for i in range(len(closes)-1)]
-    gains = [max(d, 0.0) for d in deltas]
-    losses = [max(-d, 0.0) for d in deltas]
-    avg_gain = sum(gains[:period]) / period
-    avg_loss = sum(losses[:period]) / period
-    rsis: List[float] = []
-    for i in range(period, len(deltas)):
-        avg_gain = (avg_gain*(period-1)+gains[i]) / period
-        avg_loss = (avg_loss*(period-1)+losses[i]) / period
-        if avg_loss == 0 and avg_gain == 0:
-            rs = 1.0
-        elif avg_loss == 0:
-            rs = float("inf")
-        elif avg_gain == 0:
-            rs = 0.0
-        else:
-            rs = avg_gain/avg_loss
-        rsi = 100.0 if rs == float("inf") else (0.0 if rs == 0.0 else (100 - 100/(1+rs)))
-        rsis.append(rsi)
-    return rsis
-
-def macd_histogram(closes: List[float]) -> float:
-    if len(closes) < 35: return 0.0
-    ema12 = ema_series(closes, 12)
-    ema26 = ema_series(closes, 26)
-    n = min(len(ema12), len(ema26))
-    macd_line = [a-b for a,b in zip(ema12[-n:], ema26[-n:])]
-    signal = ema_series(macd_line, 9)
-    return round((macd_line[-1]-signal[-1]) if signal else 0.0, 4)
-
 def true_range(h: float, l: float, pc: float) -> float:
     return max(h-l, abs(h-pc), abs(l-pc))
 
-def atr(highs: List[float], lows: List[float], closes: List[float], period: int = 14) -> float:
-    if len(closes) <= period: return 0.0
-    trs = [true_range(highs[i], lows[i], closes[i-1]) for i in range(1, len(closes))]
-    return sum(trs[-period:]) / period
-
-def dmi_adx(highs: List[float], lows: List[float], closes: List[float], period: int = 14) -> Tuple[float,float,float]:
-    if len(closes) <= period + 1: return (0.0,0.0,0.0)
-    trs, plus_dm, minus_dm = [], [], []
-    for i in range(1, len(closes)):
-        up = highs[i]-highs[i-1]
-        down = lows[i-1]-lows[i]
-        plus_dm.append(up if (up>down and up>0) else 0.0)
-        minus_dm.append(down if (down>up and down>0) else 0.0)
-        trs.append(true_range(highs[i], lows[i], closes[i-1]))
-    def wilder(arr: List[float], p: int) -> List[float]:
-        if len(arr) < p: return []
-        sm = [sum(arr[:p])]
-        for x in arr[p:]:
-            sm.append(sm[-1] - (sm[-1]/p) + x)
-        return sm
-    atr_w = [x/period for x in wilder(trs, period)]
-    pdm_w = [x/period for x in wilder(plus_dm, period)]
-    mdm_w = [x/period for x in wilder(minus_dm, period)]
-    if not atr_w or not pdm_w or not mdm_w: return (0.0,0.0,0.0)
-    plus_di  = [100*(p/t) if t else 0.0 for p,t in zip(pdm_w[-len(atr_w):], atr_w)]
-    minus_di = [100*(m/t) if t else 0.0 for m,t in zip(mdm_w[-len(atr_w):], atr_w)]
-    dx = [100*abs(p-m)/(p+m) if (p+m) else 0.0 for p,m in zip(plus_di, minus_di)]
-    if len(dx) < period: return (plus_di[-1], minus_di[-1], 0.0)
-    adx_vals = [sum(dx[:period])/period]
-    for x in dx[period:]:
-        adx_vals.append((adx_vals[-1]*(period-1)+x)/period)
-    return (plus_di[-1], minus_di[-1], adx_vals[-1])
-
 def detect_candle_pattern(opens: List[float], closes: List[float], highs: List[float], lows: List[float]) -> str:
     if not opens or not closes: return ""
     o,c,h,l = opens[-1], closes[-1], highs[-1], lows[-1]
@@ -193,6 +146,269 @@ def trend_strength(closes: List[float], volumes: List[float]) -> str:
     if slope<0 and volumes[-1]>1.2*avg_vol: return "Downtrend 🔽"
     return "Sideways ⏸️"
 
+# ======== INDIKATOR INKREMENTAL (STATE PER SERIES) ========
+# Setiap objek di-update O(1) per candle close. peek() menghitung nilai
+# sementara untuk candle yang masih berjalan tanpa mengubah state.
+
+def _rsi_from_avgs(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0 and avg_gain == 0: return 50.0
+    if avg_loss == 0: return 100.0
+    if avg_gain == 0: return 0.0
+    return 100 - 100/(1 + avg_gain/avg_loss)
+
+class SmaState:
+    """Rata-rata sederhana; fallback ke rata-rata semua data bila belum penuh (sama dgn slicing lama)."""
+    __slots__ = ("period", "window", "total")
+    def __init__(self, period: int):
+        self.period = period
+        self.window: deque = deque(maxlen=period)
+        self.total = 0.0
+
+    def update(self, x: float):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+
+    def peek(self, x: float) -> float:
+        if len(self.window) == self.period:
+            return (self.total - self.window[0] + x) / self.period
+        return (self.total + x) / (len(self.window) + 1)
+
+class EmaState:
+    """EMA dengan seed SMA dari `period` nilai pertama, lalu rekursif."""
+    __slots__ = ("period", "k", "count", "seed", "value")
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2 / (period + 1)
+        self.count = 0
+        self.seed = 0.0
+        self.value: Optional[float] = None
+
+    def _next(self, x: float) -> Optional[float]:
+        if self.value is not None:
+            return (x - self.value) * self.k + self.value
+        if self.count + 1 == self.period:
+            return (self.seed + x) / self.period
+        return None
+
+    def update(self, x: float):
+        nxt = self._next(x)
+        if nxt is None:
+            self.seed += x
+        self.value = nxt
+        self.count += 1
+
+    def peek(self, x: float) -> Optional[float]:
+        return self._next(x)
+
+class RsiState:
+    """Wilder RSI; seed rata-rata gain/loss `period` delta pertama."""
+    __slots__ = ("period", "prev", "n", "sum_gain", "sum_loss", "avg_gain", "avg_loss")
+    def __init__(self, period: int):
+        self.period = period
+        self.prev: Optional[float] = None
+        self.n = 0
+        self.sum_gain = self.sum_loss = 0.0
+        self.avg_gain = self.avg_loss = 0.0
+
+    def update(self, close: float):
+        if self.prev is not None:
+            d = close - self.prev
+            gain, loss = max(d, 0.0), max(-d, 0.0)
+            p = self.period
+            if self.n < p:
+                self.sum_gain += gain; self.sum_loss += loss
+                if self.n + 1 == p:
+                    self.avg_gain, self.avg_loss = self.sum_gain/p, self.sum_loss/p
+            else:
+                self.avg_gain = (self.avg_gain*(p-1) + gain) / p
+                self.avg_loss = (self.avg_loss*(p-1) + loss) / p
+            self.n += 1
+        self.prev = close
+
+    @property
+    def value(self) -> Optional[float]:
+        if self.n <= self.period: return None
+        return _rsi_from_avgs(self.avg_gain, self.avg_loss)
+
+    def peek(self, close: float) -> Optional[float]:
+        tmp = copy.copy(self)
+        tmp.update(close)
+        return tmp.value
+
+class AtrState:
+    """Rata-rata TR `period` terakhir (bukan Wilder)."""
+    __slots__ = ("period", "prev_close", "trs", "total")
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.trs: deque = deque(maxlen=period)
+        self.total = 0.0
+
+    def update(self, h: float, l: float, c: float):
+        if self.prev_close is not None:
+            tr = true_range(h, l, self.prev_close)
+            if len(self.trs) == self.period:
+                self.total -= self.trs[0]
+            self.trs.append(tr)
+            self.total += tr
+        self.prev_close = c
+
+    def peek(self, h: float, l: float, c: float) -> float:
+        if self.prev_close is None: return 0.0
+        tr = true_range(h, l, self.prev_close)
+        if len(self.trs) == self.period:
+            return (self.total - self.trs[0] + tr) / self.period
+        if len(self.trs) + 1 == self.period:
+            return (self.total + tr) / self.period
+        return 0.0
+
+class DmiState:
+    """Wilder DMI/ADX; ADX = 0 sampai ada `period` nilai DX."""
+    __slots__ = ("period", "prev_h", "prev_l", "prev_c", "n",
+                 "sm_tr", "sm_p", "sm_m", "n_dx", "sum_dx", "adx", "plus_di", "minus_di")
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_h = self.prev_l = self.prev_c = None
+        self.n = 0
+        self.sm_tr = self.sm_p = self.sm_m = 0.0
+        self.n_dx = 0
+        self.sum_dx = 0.0
+        self.adx = 0.0
+        self.plus_di = self.minus_di = 0.0
+
+    def update(self, h: float, l: float, c: float):
+        if self.prev_c is not None:
+            p = self.period
+            up = h - self.prev_h
+            down = self.prev_l - l
+            pdm = up if (up > down and up > 0) else 0.0
+            mdm = down if (down > up and down > 0) else 0.0
+            tr = true_range(h, l, self.prev_c)
+            if self.n < p:
+                self.sm_tr += tr; self.sm_p += pdm; self.sm_m += mdm
+            else:
+                self.sm_tr += tr - self.sm_tr/p
+                self.sm_p  += pdm - self.sm_p/p
+                self.sm_m  += mdm - self.sm_m/p
+            self.n += 1
+            if self.n >= p:
+                t = self.sm_tr / p
+                self.plus_di  = 100*(self.sm_p/p)/t if t else 0.0
+                self.minus_di = 100*(self.sm_m/p)/t if t else 0.0
+                s = self.plus_di + self.minus_di
+                dx = 100*abs(self.plus_di - self.minus_di)/s if s else 0.0
+                if self.n_dx < p:
+                    self.sum_dx += dx
+                    if self.n_dx + 1 == p:
+                        self.adx = self.sum_dx / p
+                else:
+                    self.adx = (self.adx*(p-1) + dx) / p
+                self.n_dx += 1
+        self.prev_h, self.prev_l, self.prev_c = h, l, c
+
+    @property
+    def value(self) -> Tuple[float, float, float]:
+        if self.n <= self.period: return (0.0, 0.0, 0.0)
+        return (self.plus_di, self.minus_di, self.adx if self.n_dx >= self.period else 0.0)
+
+    def peek(self, h: float, l: float, c: float) -> Tuple[float, float, float]:
+        tmp = copy.copy(self)
+        tmp.update(h, l, c)
+        return tmp.value
+
+class MacdState:
+    """MACD(12/26/9) histogram; 0 bila candle < 35."""
+    __slots__ = ("fast", "slow", "signal", "n")
+    def __init__(self):
+        self.fast, self.slow, self.signal = EmaState(12), EmaState(26), EmaState(9)
+        self.n = 0
+
+    def update(self, close: float):
+        self.fast.update(close)
+        self.slow.update(close)
+        if self.slow.value is not None:
+            self.signal.update(self.fast.value - self.slow.value)
+        self.n += 1
+
+    def peek(self, close: float) -> float:
+        if self.n + 1 < 35: return 0.0
+        f, s = self.fast.peek(close), self.slow.peek(close)
+        line = f - s
+        sig = self.signal.peek(line)
+        return round((line - sig) if sig is not None else 0.0, 4)
+
+class SeriesIndicators:
+    """State indikator untuk satu (symbol, interval).
+
+    Candle closed di-commit sekali (O(1) per candle); candle terakhir dari
+    klines selalu dianggap masih berjalan dan hanya di-peek.
+    """
+    RSI_HIST = 5  # detect_divergence butuh 5 nilai RSI terakhir
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.last_open: Optional[int] = None
+        self.sma7, self.sma25, self.sma99 = SmaState(7), SmaState(25), SmaState(99)
+        self.rsi6, self.rsi14 = RsiState(6), RsiState(14)
+        self.rsi6_hist: deque = deque(maxlen=self.RSI_HIST - 1)
+        self.atr14 = AtrState(14)
+        self.dmi14 = DmiState(14)
+        self.macd = MacdState()
+
+    def _commit(self, k: list):
+        h, l, c = float(k[2]), float(k[3]), float(k[4])
+        for s in (self.sma7, self.sma25, self.sma99, self.rsi6, self.rsi14, self.macd):
+            s.update(c)
+        self.atr14.update(h, l, c)
+        self.dmi14.update(h, l, c)
+        r = self.rsi6.value
+        if r is not None:
+            self.rsi6_hist.append(r)
+        self.last_open = int(k[0])
+
+    def sync(self, data: List[list]) -> Dict:
+        if self.last_open is not None and data and int(data[-1][0]) <= self.last_open:
+            # window basi (mis. klines cache scan lain): candle terakhirnya sudah
+            # di-commit, jadi hitung penuh dari window ini tanpa menyentuh state
+            tmp = SeriesIndicators()
+            return tmp.sync(data)
+        closed = data[:-1]
+        if self.last_open is None or not closed or int(closed[0][0]) > self.last_open:
+            # belum ada state atau ada gap -> seed ulang dari history
+            self.reset()
+            for k in closed:
+                self._commit(k)
+        else:
+            for k in closed:
+                if int(k[0]) > self.last_open:
+                    self._commit(k)
+        return self.snapshot(data[-1])
+
+    def snapshot(self, k: list) -> Dict:
+        h, l, c = float(k[2]), float(k[3]), float(k[4])
+        rsi6 = self.rsi6.peek(c)
+        rsi6_hist = list(self.rsi6_hist) + ([rsi6] if rsi6 is not None else [])
+        return {
+            "sma7": self.sma7.peek(c), "sma25": self.sma25.peek(c), "sma99": self.sma99.peek(c),
+            "rsi6": rsi6, "rsi6_hist": rsi6_hist, "rsi14": self.rsi14.peek(c),
+            "atr14": self.atr14.peek(h, l, c),
+            "adx": self.dmi14.peek(h, l, c)[2],
+            "macd_h": self.macd.peek(c),
+        }
+
+INDICATOR_STATE: Dict[Tuple[str, str], SeriesIndicators] = {}
+
+def series_indicators(symbol: str, interval: str, data: List[list]) -> Dict:
+    """Sinkronkan state (symbol, interval) dengan klines terbaru lalu kembalikan nilai sementara."""
+    st = INDICATOR_STATE.get((symbol, interval))
+    if st is None:
+        st = INDICATOR_STATE[(symbol, interval)] = SeriesIndicators()
+    return st.sync(data)
+
 class BinanceClient:
     BASE = "https://api.binance.com"
     def __init__(self, session: aiohttp.ClientSession, http_sem: asyncio.Semaphore):
@@ -215,32 +431,35 @@ class BinanceClient:
                 if attempt == 2: raise
                 await asyncio.sleep(0.3 * (attempt+1))
 
+    def clear_cache(self):
+        for bucket in self.cache.values():
+            bucket.clear()
+
     def _fresh(self, bucket: str, key: str) -> bool:
         if key not in self.cache[bucket]: return False
         return (time.time() - self.cache[bucket][key][1]) < self.ttl[bucket]
 
-    async def price(self, symbol: str) -> float:
-        if self._fresh("price", symbol):
-            return float(self.cache["price"][symbol][0])
-        data = await self._get("/api/v3/ticker/price", {"symbol": symbol})
-        price = float(data["price"])
-        self.cache["price"][symbol] = (price, time.time())
-        return price
-
-    async def ticker24h(self, symbol: str) -> dict:
-        if self._fresh("ticker24", symbol):
-            return self.cache["ticker24"][symbol][0]
-        data = await self._get("/api/v3/ticker/24hr", {"symbol": symbol})
-        self.cache["ticker24"][symbol] = (data, time.time())
-        return data
-
-    async def book_ticker(self, symbol: str) -> dict:
-        key = f"book:{symbol}"
-        if self._fresh("price", key):
-            return self.cache["price"][key][0]
-        data = await self._get("/api/v3/ticker/bookTicker", {"symbol": symbol})
-        self.cache["price"][key] = (data, time.time())
-        return data
+    async def all_prices(self) -> Dict[str, float]:
+        """Snapshot harga semua symbol dalam satu request (tanpa cache)."""
+        data = await self._get("/api/v3/ticker/price")
+        return {d["symbol"]: float(d["price"]) for d in data}
+
+    async def all_tickers24h(self) -> Dict[str, dict]:
+        """Ticker 24 jam semua symbol dalam satu request (weight 80, jauh lebih murah dari per-symbol utk universe besar)."""
+        if self._fresh("ticker24", "*"):
+            return self.cache["ticker24"]["*"][0]
+        data = await self._get("/api/v3/ticker/24hr")
+        out = {d["symbol"]: d for d in data}
+        self.cache["ticker24"]["*"] = (out, time.time())
+        return out
+
+    async def all_book_tickers(self) -> Dict[str, dict]:
+        if self._fresh("price", "book:*"):
+            return self.cache["price"]["book:*"][0]
+        data = await self._get("/api/v3/ticker/bookTicker")
+        out = {d["symbol"]: d for d in data}
+        self.cache["price"]["book:*"] = (out, time.time())
+        return out
 
     async def symbol_info(self, symbol: str) -> dict:
         """Ambil tickSize & stepSize untuk symbol, cache 6 jam."""
@@ -270,18 +489,17 @@ class BinanceClient:
         self.cache["klines"][key] = (data, time.time())
         return data
 
+def _regime_from(last_close: float, ind: Dict) -> str:
+    ema7, ema25, ema99 = ind["sma7"], ind["sma25"], ind["sma99"]
+    r = ind["rsi14"] if ind["rsi14"] is not None else 50
+    if last_close > ema7 > ema25 > ema99 and r > 55: return "UP"
+    if last_close < ema7 < ema25 < ema99 and r < 45: return "DOWN"
+    return "SIDEWAYS"
+
 async def regime_for(symbol: str, client: BinanceClient, interval: str) -> str:
     try:
-        data = await client.klines(symbol, interval, 99)
-        closes = [float(k[4]) for k in data]
-        ema7 = sum(closes[-7:])/7
-        ema25 = sum(closes[-25:])/25
-        ema99 = sum(closes[-99:])/99
-        rsi_last = rsi_series(closes,14)
-        r = rsi_last[-1] if rsi_last else 50
-        if closes[-1] > ema7 > ema25 > ema99 and r > 55: return "UP"
-        if closes[-1] < ema7 < ema25 < ema99 and r < 45: return "DOWN"
-        return "SIDEWAYS"
+        data = await client.klines(symbol, interval, KLINE_LIMIT)
+        return _regime_from(float(data[-1][4]), series_indicators(symbol, interval, data))
     except Exception as e:
         log.info(f"regime_for {symbol} {interval}: {e}")
         return "SIDEWAYS"
@@ -296,15 +514,7 @@ async def btc_regime_combo(client: BinanceClient) -> str:
 async def daily_regime_light(symbol: str, client: BinanceClient) -> str:
     try:
         data = await client.klines(symbol, "1d", 99)
-        closes = [float(k[4]) for k in data]
-        ema7 = sum(closes[-7:])/7
-        ema25 = sum(closes[-25:])/25
-        ema99 = sum(closes[-99:])/99
-        rsi_last = rsi_series(closes,14)
-        r = rsi_last[-1] if rsi_last else 50
-        if closes[-1] > ema7 > ema25 > ema99 and r > 55: return "UP"
-        if closes[-1] < ema7 < ema25 < ema99 and r < 45: return "DOWN"
-        return "SIDEWAYS"
+        return _regime_from(float(data[-1][4]), series_indicators(symbol, "1d", data))
     except Exception:
         return "SIDEWAYS"
 
@@ -390,9 +600,7 @@ def _min_tp_pct_for_price(price: float) -> Tuple[float, float]:
     return (MIN_TP1_LARGE, MIN_TP2_LARGE)
 
 def _btc_factor(strategy_name: str, btc_regime: str) -> float:
-    if strategy_name == "🟢 Scalping Breakout":
-        return {"UP": DTP_BREAKOUT_UP, "SIDEWAYS": DTP_BREAKOUT_SIDE, "DOWN": DTP_BREAKOUT_DOWN}.get(btc_regime, 1.0)
-    return 1.0
+    return COMPILED_STRATEGIES[strategy_name].btc_factor.get(btc_regime, 1.0)
 
 def compute_dynamic_targets(
     strategy_name: str,
@@ -404,11 +612,7 @@ def compute_dynamic_targets(
     spread_pct: float,
     sl_mult_base: float,
 ) -> Tuple[float, float, float]:
-    base_mult = {
-        "🔴 Jemput Bola":       (2.0, 3.8),
-        "🟡 Rebound Swing":     (1.6, 2.8),
-        "🟢 Scalping Breakout": (1.2, 2.0),
-    }[strategy_name]
+    base_mult = COMPILED_STRATEGIES[strategy_name].tp_mult
 
     f_btc = _btc_factor(strategy_name, btc_regime)
     f_atr = ATR_LOW_FACTOR if atr_pct <= ATR_LOW_PCT else (ATR_HIGH_FACTOR if atr_pct >= ATR_HIGH_PCT else 1.0)
@@ -433,13 +637,106 @@ def compute_dynamic_targets(
 
 # ============== /TP DINAMIS ==============
 
+# ============== REGISTRY STRATEGI ==============
+# Tiap strategi = spec deklaratif. Predikat menerima dict konteks `c` yang
+# diisi analisa_pair_tf (tf, price, btc_regime, rsi, rsi_limit, ema7/25/99,
+# atr_pct, adx, adx_min, atr_min_breakout, closes, highs, require_mtf, lalu
+# divergence, zone, vol_spike, macd_h, candle, support_break utk skor).
+# Tambah strategi cukup lewat register_strategy(), tanpa menyentuh analisa_pair_tf.
+
+SCORE_TERMS = {
+    "mtf":        lambda c: c["require_mtf"],
+    "adx":        lambda c: c["adx"] >= c["adx_min"],
+    "atrpct":     lambda c: c["atr_pct"] >= c["atr_min_breakout"],
+    "div":        lambda c: bool(c["divergence"]),
+    "zone":       lambda c: bool(c["zone"]) and "Dekat" in c["zone"],
+    "vol":        lambda c: c["vol_spike"],
+    "macd":       lambda c: c["macd_h"] > 0,
+    "candle":     lambda c: bool(c["candle"]),
+    "support_ok": lambda c: not c["support_break"],
+}
+DEFAULT_SCORE = ("mtf", "adx", "div", "zone", "vol", "macd", "candle", "support_ok")
+
+def _gate_pullback_only_in_uptrend(c: Dict) -> bool:
+    # saat BTC UP, strategi beli-bawah hanya boleh utk pullback dalam di TF kecil
+    if c["btc_regime"] != "UP": return True
+    return (c["tf"] in ("15m","1h")) and (c["rsi"] < 38) and (c["price"] < c["ema7"]*0.995)
+
+def _gate_breakout(c: Dict) -> bool:
+    return c["btc_regime"] == "UP" and c["atr_pct"] >= c["atr_min_breakout"]
+
+def _valid_breakout(c: Dict) -> bool:
+    highs, price, ema7 = c["highs"], c["price"], c["ema7"]
+    breakout_ok = c["closes"][-1] > max(highs[-3:-1]) if len(highs) >= 3 else (price > ema7)
+    return (price > ema7 > 0) and (price > c["ema25"]) and (price > c["ema99"]) and (c["rsi"] >= c["rsi_limit"]) and breakout_ok
+
+STRATEGY_SPECS: Dict[str, Dict] = {
+    "🔴 Jemput Bola": {
+        "rsi_limit": 40, "volume_min_usd": 1_000_000, "daily_not_up": True,
+        "gate": _gate_pullback_only_in_uptrend,
+        "valid": lambda c: (c["price"] < c["ema25"]) and (c["price"] > 0.9*c["ema99"]) and (c["rsi"] < c["rsi_limit"]),
+        "tp_mult": (2.0, 3.8), "sl_mult": 0.9,
+    },
+    "🟡 Rebound Swing": {
+        "rsi_limit": 50, "volume_min_usd": 1_500_000, "daily_not_up": True,
+        "gate": _gate_pullback_only_in_uptrend,
+        "valid": lambda c: (c["price"] < c["ema25"]) and (c["price"] > c["ema7"]) and (c["rsi"] < c["rsi_limit"]),
+        "tp_mult": (1.6, 2.8), "sl_mult": 1.1,
+    },
+    "🟢 Scalping Breakout": {
+        "rsi_limit": 60, "volume_min_usd": 3_000_000, "daily_not_up": False,
+        "gate": _gate_breakout,
+        "valid": _valid_breakout,
+        "tp_mult": (1.2, 2.0), "sl_mult": 1.3,
+        "btc_factor": {"UP": DTP_BREAKOUT_UP, "SIDEWAYS": DTP_BREAKOUT_SIDE, "DOWN": DTP_BREAKOUT_DOWN},
+        "score": ("mtf", "adx", "atrpct", "div", "zone", "vol", "macd", "candle", "support_ok"),
+    },
+}
+
+class CompiledStrategy:
+    """Spec yang sudah di-resolve: default terisi dan bobot skor terikat sekali di startup."""
+    __slots__ = ("name", "rsi_limit", "volume_min_usd", "daily_not_up", "tfs",
+                 "gate", "valid", "tp_mult", "sl_mult", "btc_factor", "terms")
+
+    def __init__(self, name: str, spec: Dict, weights: Dict[str, float]):
+        self.name = name
+        self.rsi_limit = float(spec["rsi_limit"])
+        self.volume_min_usd = float(spec["volume_min_usd"])
+        self.daily_not_up = bool(spec.get("daily_not_up", False))
+        self.tfs = tuple(spec.get("tfs", TF_INTERVALS.values()))
+        self.gate = spec.get("gate") or (lambda c: True)
+        self.valid = spec["valid"]
+        self.tp_mult = tuple(spec["tp_mult"])
+        self.sl_mult = float(spec["sl_mult"])
+        self.btc_factor = dict(spec.get("btc_factor", {}))
+        self.terms = tuple((weights[k], SCORE_TERMS[k]) for k in spec.get("score", DEFAULT_SCORE))
+
+    def score(self, c: Dict) -> float:
+        score = 0.0
+        for w, pred in self.terms:
+            if pred(c): score += w
+        return score
+
+COMPILED_STRATEGIES: Dict[str, CompiledStrategy] = {}
+WEIGHTS = load_weights()
+
+def register_strategy(name: str, spec: Dict):
+    # catatan: di mode SCAN_WORKERS hanya STRATEGY_SPECS yang dikenal worker;
+    # strategi yg didaftarkan saat runtime dipindai in-process
+    COMPILED_STRATEGIES[name] = CompiledStrategy(name, spec, WEIGHTS)
+
+for _name, _spec in STRATEGY_SPECS.items():
+    register_strategy(_name, _spec)
+
+# ============== /REGISTRY STRATEGI ==============
+
 async def analisa_pair_tf(
     client: BinanceClient, symbol: str, strategy_name: str, price: float, tf: str,
     adx_min: float, atr_min_breakout: float, avg_trades_min: int,
     btc_regime: str, require_mtf: bool, vol24: float, spread_pct: float
 ) -> Optional[Dict]:
     try:
-        data = await client.klines(symbol, tf, 120)
+        data = await client.klines(symbol, tf, KLINE_LIMIT)
         closes = [float(k[4]) for k in data]
         opens  = [float(k[1]) for k in data]
         highs  = [float(k[2]) for k in data]
@@ -451,25 +748,24 @@ async def analisa_pair_tf(
         if avg_tf_trades < avg_trades_min:
             return None
 
-        rsi6 = rsi_series(closes,6)
-        rsi_last = round(rsi6[-1],2) if rsi6 else 50
-        ema7  = sum(closes[-7:])/7 if len(closes)>=7 else closes[-1]
-        ema25 = sum(closes[-25:])/25 if len(closes)>=25 else sum(closes)/len(closes)
-        ema99 = sum(closes[-99:])/99 if len(closes)>=99 else sum(closes)/len(closes)
-        atr14 = atr(highs,lows,closes,14)
+        ind = series_indicators(symbol, tf, data)
+        rsi6 = ind["rsi6_hist"]
+        rsi_last = round(ind["rsi6"],2) if ind["rsi6"] is not None else 50
+        ema7, ema25, ema99 = ind["sma7"], ind["sma25"], ind["sma99"]
+        atr14 = ind["atr14"]
         atr_pct = (atr14/price)*100 if price>0 else 0.0
-        _,_,adx_val = dmi_adx(highs,lows,closes,14)
+        adx_val = ind["adx"]
 
-        if strategy_name == "🟢 Scalping Breakout":
-            if btc_regime != "UP":
-                return None
-            if atr_pct < atr_min_breakout:
-                return None
-        else:
-            if btc_regime == "UP":
-                allow_pullback = (tf in ("15m","1h")) and (rsi_last < 38) and (price < ema7*0.995)
-                if not allow_pullback:
-                    return None
+        strat = COMPILED_STRATEGIES[strategy_name]
+        c = {
+            "tf": tf, "price": price, "btc_regime": btc_regime,
+            "rsi": rsi_last, "rsi_limit": strat.rsi_limit,
+            "ema7": ema7, "ema25": ema25, "ema99": ema99,
+            "atr_pct": atr_pct, "adx": adx_val, "adx_min": adx_min, "atr_min_breakout": atr_min_breakout,
+            "closes": closes, "highs": highs, "require_mtf": require_mtf,
+        }
+        if not strat.gate(c):
+            return None
 
         if adx_val < adx_min:
             return None
@@ -481,15 +777,7 @@ async def analisa_pair_tf(
             elif tf == "1h":
                 mtf_note = f" (4h TF {await regime_for(symbol, client, '4h')})"
 
-        valid = False
-        if strategy_name == "🔴 Jemput Bola":
-            valid = (price < ema25) and (price > 0.9*ema99) and (rsi_last < 40)
-        elif strategy_name == "🟡 Rebound Swing":
-            valid = (price < ema25) and (price > ema7) and (rsi_last < 50)
-        elif strategy_name == "🟢 Scalping Breakout":
-            breakout_ok = closes[-1] > max(highs[-3:-1]) if len(highs) >= 3 else (price > ema7)
-            valid = (price > ema7 > 0) and (price > ema25) and (price > ema99) and (rsi_last >= 60) and breakout_ok
-        if not valid:
+        if not strat.valid(c):
             return None
 
         # === Ambil tickSize & set desimal ===
@@ -498,7 +786,6 @@ async def analisa_pair_tf(
         decimals = _decimals_from_tick(price_tick)
 
         # === TP DINAMIS ===
-        sl_mult_base = {"🔴 Jemput Bola": 0.9, "🟡 Rebound Swing": 1.1, "🟢 Scalping Breakout": 1.3}[strategy_name]
         tp1, tp2, sl = compute_dynamic_targets(
             strategy_name=strategy_name,
             price=price,
@@ -507,7 +794,7 @@ async def analisa_pair_tf(
             btc_regime=btc_regime,
             vol24=vol24,
             spread_pct=spread_pct,
-            sl_mult_base=sl_mult_base
+            sl_mult_base=strat.sl_mult
         )
 
         # Bulatkan semua harga ke tick Binance
@@ -523,19 +810,11 @@ async def analisa_pair_tf(
         vol_spike = is_volume_spike(volumes)
         support_break = (price < 0.985*ema25) and (price < 0.97*ema7)
         trend = trend_strength(closes, volumes)
-        macd_h = macd_histogram(closes)
+        macd_h = ind["macd_h"]
 
-        weights = load_weights()
-        score = 0.0
-        if require_mtf: score += weights["mtf"]
-        if adx_val>=adx_min: score += weights["adx"]
-        if strategy_name=="🟢 Scalping Breakout" and atr_pct>=atr_min_breakout: score += weights["atrpct"]
-        if divergence: score += weights["div"]
-        if zone and "Dekat" in zone: score += weights["zone"]
-        if vol_spike: score += weights["vol"]
-        if macd_h>0: score += weights["macd"]
-        if candle: score += weights["candle"]
-        if not support_break: score += weights["support_ok"]
+        c.update(divergence=divergence, zone=zone, vol_spike=vol_spike, macd_h=macd_h,
+                 candle=candle, support_break=support_break)
+        score = strat.score(c)
 
         return {
             "symbol": symbol, "tf": tf, "price": price_q,
@@ -594,8 +873,211 @@ def cooldown_ok(symbol: str, strategy: str) -> bool:
     t = LAST_SENT.get((symbol, strategy), 0)
     return (time.time() - t) >= COOLDOWN_MINUTES * 60
 
-def mark_sent(symbol: str, strategy: str):
-    LAST_SENT[(symbol, strategy)] = time.time()
+def mark_sent(symbol: str, strategy: str) -> float:
+    ts = LAST_SENT[(symbol, strategy)] = time.time()
+    return ts
+
+def release_sent(symbol: str, strategy: str, ts: float):
+    # batalkan reservasi cooldown yg tidak jadi terkirim (kecuali sudah ditimpa scan lain)
+    if LAST_SENT.get((symbol, strategy)) == ts:
+        del LAST_SENT[(symbol, strategy)]
+
+# ======== OUTBOUND TELEGRAM (RATE LIMIT & BATCHING) ========
+
+class OutboundLimiter:
+    """Rate limiter bersama utk semua panggilan Bot API keluar (global + per chat).
+
+    Tiap pemanggil memesan slot waktu berikutnya lalu tidur sampai slotnya;
+    tidak ada await di antara baca & tulis jadwal, jadi aman tanpa lock.
+    """
+    def __init__(self, global_rps: float, chat_interval: float):
+        self.global_interval = 1.0 / global_rps if global_rps > 0 else 0.0
+        self.chat_interval = chat_interval
+        self._next_global = 0.0
+        self._next_chat: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int):
+        now = time.monotonic()
+        t = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+        self._next_global = t + self.global_interval
+        self._next_chat[chat_id] = t + self.chat_interval
+        if len(self._next_chat) > 1000:
+            self._next_chat = {k: v for k, v in self._next_chat.items() if v > now}
+        if t > now:
+            await asyncio.sleep(t - now)
+
+LIMITER = OutboundLimiter(TG_GLOBAL_RPS, TG_CHAT_INTERVAL)
+
+async def tg_send(bot, chat_id: int, text: str, **kwargs):
+    await LIMITER.wait(chat_id)
+    return await bot.send_message(chat_id, text, **kwargs)
+
+async def tg_edit(msg, text: str, **kwargs):
+    await LIMITER.wait(msg.chat_id)
+    try:
+        return await msg.edit_text(text, **kwargs)
+    except Exception as e:
+        # mis. "message is not modified" -> abaikan, progres hanya kosmetik
+        log.info(f"edit message {msg.message_id} gagal: {e}")
+
+async def reply(update: Update, text: str, **kwargs):
+    await LIMITER.wait(update.effective_chat.id)
+    return await update.message.reply_text(text, **kwargs)
+
+def _tg_len(s: str) -> int:
+    # Telegram menghitung panjang dalam UTF-16 code unit (emoji = 2)
+    return len(s.encode("utf-16-le")) // 2
+
+def pack_messages(parts: List[str], limit: int = TG_MAX_LEN, sep: str = "\n\n") -> List[List[int]]:
+    """Kelompokkan pesan HTML utuh (index, urut) menjadi sesedikit mungkin pesan <= limit.
+
+    Gabungkan tiap kelompok dengan `sep`; index dipakai utk menandai sinyal per pesan terkirim.
+    """
+    out: List[List[int]] = []
+    cur: List[int] = []
+    cur_len = 0
+    for i, p in enumerate(parts):
+        n = _tg_len(p)
+        if cur and cur_len + _tg_len(sep) + n > limit:
+            out.append(cur)
+            cur, cur_len = [], 0
+        cur_len += (_tg_len(sep) if cur else 0) + n
+        cur.append(i)
+    if cur:
+        out.append(cur)
+    return out
+
+# ======== TRACKER HASIL SINYAL (TP1/TP2/SL) ========
+
+class SignalTracker:
+    """Pantau level TP1/TP2/SL sinyal terkirim lewat index trigger per symbol.
+
+    TP disimpan di min-heap (kena saat harga >= level), SL di max-heap (kena
+    saat harga <= level), jadi tiap tick cukup O(log n) per level yang tersentuh.
+    Entry milik sinyal yang sudah selesai dibuang secara lazy.
+    """
+    def __init__(self):
+        self.signals: Dict[int, Dict] = {}
+        self.tp_heap: Dict[str, List[Tuple[float, int, str]]] = {}   # (level, sid, "TP1"/"TP2")
+        self.sl_heap: Dict[str, List[Tuple[float, int]]] = {}        # (-level, sid)
+        self.expiry: List[Tuple[float, int]] = []
+        self.stale: Dict[str, int] = {}
+        self.stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._seq = 0
+
+    def has_open(self) -> bool:
+        return bool(self.signals)
+
+    def register(self, chat_id: int, strategy: str, mode: str, res: Dict) -> int:
+        self._seq += 1
+        sid, sym = self._seq, res["symbol"]
+        self.signals[sid] = {
+            "chat_id": chat_id, "strategy": strategy, "mode": mode, "symbol": sym, "tf": res["tf"],
+            "entry": res["price"], "tp1": res["tp1"], "tp2": res["tp2"], "sl": res["sl"],
+            "decimals": int(res.get("decimals", 4)), "tp1_hit": False, "ts": time.time(),
+        }
+        heapq.heappush(self.tp_heap.setdefault(sym, []), (res["tp1"], sid, "TP1"))
+        heapq.heappush(self.tp_heap[sym], (res["tp2"], sid, "TP2"))
+        heapq.heappush(self.sl_heap.setdefault(sym, []), (-res["sl"], sid))
+        heapq.heappush(self.expiry, (time.time() + SIGNAL_TTL_HOURS * 3600, sid))
+        return sid
+
+    def _close(self, sid: int, outcome: str):
+        sig = self.signals.pop(sid)
+        st = self.stats.setdefault((sig["strategy"], sig["mode"]), {"n": 0, "tp1": 0, "tp2": 0, "sl": 0, "expired": 0})
+        st["n"] += 1
+        st[outcome.lower()] += 1
+        if sig["tp1_hit"]: st["tp1"] += 1
+        sym = sig["symbol"]
+        self.stale[sym] = self.stale.get(sym, 0) + 3
+        tp, sl = self.tp_heap.get(sym, []), self.sl_heap.get(sym, [])
+        if self.stale[sym] * 2 > len(tp) + len(sl):
+            # kebanyakan entry basi -> bangun ulang heap symbol ini
+            tp = [e for e in tp if e[1] in self.signals and not (e[2] == "TP1" and self.signals[e[1]]["tp1_hit"])]
+            sl = [e for e in sl if e[1] in self.signals]
+            heapq.heapify(tp); heapq.heapify(sl)
+            self.stale[sym] = 0
+            for book, heap in ((self.tp_heap, tp), (self.sl_heap, sl)):
+                if heap: book[sym] = heap
+                else: book.pop(sym, None)
+
+    def resolve(self, prices: Dict[str, float], now: Optional[float] = None) -> List[Tuple[Dict, str, float]]:
+        """Proses snapshot harga; kembalikan event (sinyal, "TP1"/"TP2"/"SL"/"EXPIRED", harga)."""
+        now = now or time.time()
+        events: List[Tuple[Dict, str, float]] = []
+        for sym in list(self.tp_heap.keys() | self.sl_heap.keys()):
+            px = prices.get(sym)
+            if px is None: continue
+            sl = self.sl_heap.get(sym, [])
+            while sl and -sl[0][0] >= px:
+                _, sid = heapq.heappop(sl)
+                if sid in self.signals:
+                    events.append((self.signals[sid], "SL", px))
+                    self._close(sid, "SL")
+                    sl = self.sl_heap.get(sym, [])
+            tp = self.tp_heap.get(sym, [])
+            while tp and tp[0][0] <= px:
+                _, sid, kind = heapq.heappop(tp)
+                sig = self.signals.get(sid)
+                if sig is None or (kind == "TP1" and sig["tp1_hit"]): continue
+                events.append((sig, kind, px))
+                if kind == "TP1":
+                    sig["tp1_hit"] = True
+                else:
+                    sig["tp1_hit"] = True  # TP2 di atas TP1
+                    self._close(sid, "TP2")
+                    tp = self.tp_heap.get(sym, [])
+        while self.expiry and self.expiry[0][0] <= now:
+            _, sid = heapq.heappop(self.expiry)
+            if sid in self.signals:
+                sig = self.signals[sid]
+                events.append((sig, "EXPIRED", prices.get(sig["symbol"], sig["entry"])))
+                self._close(sid, "EXPIRED")
+        for book in (self.tp_heap, self.sl_heap):
+            for sym in [k for k, v in book.items() if not v]:
+                del book[sym]
+        return events
+
+    def stats_text(self) -> str:
+        if not self.stats:
+            return "📊 Belum ada sinyal yang selesai dipantau."
+        lines = ["📊 Statistik sinyal (selesai):"]
+        for (strategy, mode), st in sorted(self.stats.items()):
+            n = st["n"]
+            lines.append(
+                f"{strategy} • {mode.upper()}: {n} sinyal | TP1 {st['tp1']/n*100:.0f}% | "
+                f"TP2 {st['tp2']/n*100:.0f}% | SL {st['sl']/n*100:.0f}% | Expired {st['expired']}"
+            )
+        lines.append(f"Sinyal terbuka: {len(self.signals)}")
+        return "\n".join(lines)
+
+TRACKER = SignalTracker()
+
+def build_outcome_message(sig: Dict, event: str, px: float) -> str:
+    label = {"TP1": "🎯 TP1 tercapai", "TP2": "🏁 TP2 tercapai", "SL": "🛑 SL tersentuh", "EXPIRED": "⌛ Sinyal kadaluarsa"}[event]
+    d = sig["decimals"]
+    return "\n".join([
+        f"{label}: {sanitize(sig['symbol'])} ({sanitize(sig['strategy'])} • {sanitize(sig['tf'])} • {sanitize(sig['mode'].upper())})",
+        f"Entry ${format_price_by_decimals(sig['entry'], d)} → ${format_price_by_decimals(px, d)} ({pct(px, sig['entry'])}%)",
+    ])
+
+async def track_signals(app):
+    async with aiohttp.ClientSession(headers={"User-Agent": "SignalBot/1.0"}) as session:
+        client = BinanceClient(session, asyncio.Semaphore(1))
+        while True:
+            await asyncio.sleep(TRACK_INTERVAL_SEC)
+            if not TRACKER.has_open():
+                continue
+            try:
+                events = TRACKER.resolve(await client.all_prices())
+            except Exception as e:
+                log.info(f"tracker tick error: {e}")
+                continue
+            for sig, event, px in events:
+                try:
+                    await tg_send(app.bot, sig["chat_id"], build_outcome_message(sig, event, px), parse_mode="HTML")
+                except Exception as e:
+                    log.info(f"tracker notify {sig['symbol']} error: {e}")
 
 def is_allowed(update: Update) -> bool:
     uid = update.effective_user.id if update.effective_user else 0
@@ -603,15 +1085,40 @@ def is_allowed(update: Update) -> bool:
 
 async def post_startup(app):
     me = await app.bot.get_me()
-    await app.bot.delete_webhook(drop_pending_updates=True)
+    if BOT_MODE != "webhook":
+        await app.bot.delete_webhook(drop_pending_updates=True)
+    app.bot_data["tracker_task"] = asyncio.get_running_loop().create_task(track_signals(app))
+    if SCAN_WORKERS > 1:
+        scanner = ShardedScanner(SCAN_WORKERS)
+        await scanner.warmup()
+        app.bot_data["scanner"] = scanner
+        log.warning(f"Sharded scanner aktif: {SCAN_WORKERS} worker")
     log.warning(f"BOT STARTED as @{me.username} id={me.id}")
 
+async def post_shutdown(app):
+    task = app.bot_data.pop("tracker_task", None)
+    if task:
+        # cancel -> `async with` di track_signals menutup session aiohttp
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    scanner = app.bot_data.get("scanner")
+    if scanner:
+        scanner.shutdown()
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["mode"] = None
-    await update.message.reply_text("Silakan pilih mode:", reply_markup=kb_main())
+    await reply(update, "Silakan pilih mode:", reply_markup=kb_main())
 
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("💬 Hubungi admin @KikioOreo untuk bantuan atau aktivasi.", reply_markup=kb_main())
+    await reply(update, "💬 Hubungi admin @KikioOreo untuk bantuan atau aktivasi.", reply_markup=kb_main())
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_allowed(update):
+        await reply(update, "⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
+    await reply(update, TRACKER.stats_text(), reply_markup=kb_main())
 
 async def info_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     txt = "\n".join([
@@ -621,22 +1128,22 @@ async def info_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🟢 Scalping Breakout: Malam 19.00–22.00 WIB",
         "Gunakan sesuai momentum pasar & arah BTC!",
     ])
-    await update.message.reply_text(txt, reply_markup=kb_main())
+    await reply(update, txt, reply_markup=kb_main())
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (update.message.text or "").strip()
 
     if text == "🟢 Retail Mode":
         if not is_allowed(update):
-            await update.message.reply_text("⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
+            await reply(update, "⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
         context.user_data["mode"] = "retail"
-        await update.message.reply_text("Retail Mode dipilih. Pilih strategi:", reply_markup=kb_mode()); return
+        await reply(update, "Retail Mode dipilih. Pilih strategi:", reply_markup=kb_mode()); return
 
     if text == "🧠 Pro Mode":
         if not is_allowed(update):
-            await update.message.reply_text("⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
+            await reply(update, "⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
         context.user_data["mode"] = "pro"
-        await update.message.reply_text("Pro Mode dipilih. Pilih strategi:", reply_markup=kb_mode()); return
+        await reply(update, "Pro Mode dipilih. Pilih strategi:", reply_markup=kb_mode()); return
 
     if text == "ℹ️ Info":
         await info_cmd(update, context); return
@@ -646,73 +1153,84 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if text == "⬅️ Kembali":
         context.user_data["mode"] = None
-        await update.message.reply_text("Kembali ke menu utama.", reply_markup=kb_main()); return
+        await reply(update, "Kembali ke menu utama.", reply_markup=kb_main()); return
 
-    if text in STRATEGIES.keys():
+    if text in COMPILED_STRATEGIES:
         if not is_allowed(update):
-            await update.message.reply_text("⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
+            await reply(update, "⛔ Akses ditolak. Hubungi admin untuk aktivasi.", reply_markup=kb_main()); return
         mode = context.user_data.get("mode")
         if mode not in ("retail","pro"):
-            await update.message.reply_text("Pilih mode dulu ya.", reply_markup=kb_main()); return
-        await update.message.reply_text(
-            f"🔍 [{mode.upper()}] Memindai sinyal untuk strategi {text}...\nTunggu beberapa saat...",
-            reply_markup=kb_mode()
-        )
+            await reply(update, "Pilih mode dulu ya.", reply_markup=kb_main()); return
+        scan_txt = f"🔍 [{mode.upper()}] Memindai sinyal untuk strategi {text}...\nTunggu beberapa saat..."
+        if DELIVERY_MODE == "batch":
+            # keyboard strategi tetap tampil (mode masih dipilih, bisa scan lagi / Kembali);
+            # pesan ini di-edit jadi progres lalu ringkasan -> tanpa pesan "Selesai" terpisah
+            progress = await reply(update, scan_txt)
+            await run_scan(update, context, text, mode_profile=mode, progress=progress)
+            return
+        await reply(update, scan_txt, reply_markup=kb_mode())
         await run_scan(update, context, text, mode_profile=mode)
-        await update.message.reply_text("Selesai. Kembali ke menu utama.", reply_markup=kb_main()); return
+        await reply(update, "Selesai. Kembali ke menu utama.", reply_markup=kb_main()); return
+
+    await reply(update, "Perintah tidak dikenali. Gunakan tombol.", reply_markup=kb_main())
+
+# ======== SCANNER (IN-PROCESS & SHARDED) ========
+
+PAIR_INDEX = {p: i for i, p in enumerate(PAIRS)}
+
+def rank_results(results: List[Dict]) -> List[Dict]:
+    """Urutkan kandidat by score (desc), tie-break urutan PAIRS -> hasil deterministik."""
+    return sorted(results, key=lambda r: (-r["score"], PAIR_INDEX.get(r["symbol"], len(PAIR_INDEX)), r["symbol"]))
+
+async def market_snapshot(client: BinanceClient, pairs: List[str], strategy_name: str) -> List[Tuple[str, float, float, float]]:
+    """Pre-filter universe lewat 3 request bulk: (pair, price, vol24 quote, spread%) yg lolos volume min."""
+    prices, t24, books = await asyncio.gather(client.all_prices(), client.all_tickers24h(), client.all_book_tickers())
+    vol_min = COMPILED_STRATEGIES[strategy_name].volume_min_usd
+    out: List[Tuple[str, float, float, float]] = []
+    for pair in pairs:
+        if pair not in prices or pair not in t24:
+            log.info(f"skip {pair}: tidak ada di snapshot ticker")
+            continue
+        price = prices[pair]
+        vol_q = float(t24[pair].get("quoteVolume", 0.0))
+        if vol_q < vol_min:
+            continue
+
+        bt = books.get(pair, {})
+        bid = float(bt.get("bidPrice", 0.0) or 0.0)
+        ask = float(bt.get("askPrice", 0.0) or 0.0)
+        mid = (bid + ask)/2 if (bid>0 and ask>0) else price
+        spread_pct = ((ask - bid)/mid * 100.0) if (bid>0 and ask>0 and mid>0) else 0.0
+        out.append((pair, price, vol_q, spread_pct))
+    return out
 
-    await update.message.reply_text("Perintah tidak dikenali. Gunakan tombol.", reply_markup=kb_main())
+async def scan_universe(
+    client: BinanceClient, valid_pairs: List[Tuple[str, float, float, float]], strategy_name: str,
+    mode_profile: str, btc_regime: str, on_done=None
+) -> List[Dict]:
+    """Analisa pair hasil market_snapshot dan kembalikan kandidat terbaik per pair, sudah di-ranking.
 
-async def run_scan(update: Update, context: ContextTypes.DEFAULT_TYPE, strategy_name: str, mode_profile: str="retail"):
+    Dipakai langsung oleh run_scan atau oleh tiap worker shard; on_done(n)
+    dipanggil tiap n pair selesai (utk progres).
+    """
     prof = MODE_PROFILES[mode_profile]
     adx_min         = prof["ADX_MIN"]
     atr_breakout    = prof["ATR_PCT_MIN_BREAKOUT"]
     avg_trades_min  = prof["AVG_TRADES_MIN"]
     require_2_tf    = prof["REQUIRE_2_TF"]
     thresh          = prof["THRESH"]
+    strat = COMPILED_STRATEGIES[strategy_name]
 
-    http_sem    = asyncio.Semaphore(HTTP_CONCURRENCY)
     analysis_sem = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+    report = on_done or (lambda n: None)
 
-    async with aiohttp.ClientSession(headers={"User-Agent": "SignalBot/1.0"}) as session:
-        client = BinanceClient(session, http_sem)
-        btc_regime = await btc_regime_combo(client)
-
-        async def pv(pair: str):
-            try:
-                price = await client.price(pair)
-                t24 = await client.ticker24h(pair)
-                vol_q = float(t24.get("quoteVolume", 0.0))
-
-                bt = await client.book_ticker(pair)
-                bid = float(bt.get("bidPrice", 0.0) or 0.0)
-                ask = float(bt.get("askPrice", 0.0) or 0.0)
-                mid = (bid + ask)/2 if (bid>0 and ask>0) else price
-                spread_pct = ((ask - bid)/mid * 100.0) if (bid>0 and ask>0 and mid>0) else 0.0
+    found: Dict[str, Dict] = {}
 
-                return pair, price, vol_q, spread_pct
-            except Exception as e:
-                log.info(f"skip {pair}: {e}")
-                return pair, None, None, None
-
-        results = await asyncio.gather(*(pv(p) for p in PAIRS))
-        vol_min = STRATEGIES[strategy_name]["volume_min_usd"]
-        valid_pairs = [(pair, p, v, s) for (pair, p, v, s) in results
-                       if isinstance(p, float) and isinstance(v, float) and v >= vol_min]
-
-        messages: List[str] = []
-        seen_symbol: set = set()
-
-        async def analyze_pair(pair: str, price: float, vol24: float, spread_pct: float):
-            if not cooldown_ok(pair, strategy_name):
-                return
-            daily_ok = True
-            if strategy_name in ("🔴 Jemput Bola","🟡 Rebound Swing"):
-                dr = await daily_regime_light(pair, client)
-                if dr == "UP":
-                    daily_ok = False
-            if not daily_ok:
-                return
+    async def analyze_pair(pair: str, price: float, vol24: float, spread_pct: float):
+        try:
+            if strat.daily_not_up:
+                if await daily_regime_light(pair, client) == "UP":
+                    return
 
             async with analysis_sem:
                 tasks = [
@@ -721,34 +1239,171 @@ async def run_scan(update: Update, context: ContextTypes.DEFAULT_TYPE, strategy_
                         adx_min, atr_breakout, avg_trades_min,
                         btc_regime, require_2_tf, vol24, spread_pct
                     )
-                    for tf in TF_INTERVALS.values()
+                    for tf in strat.tfs
                 ]
                 out = await asyncio.gather(*tasks)
                 cand = [r for r in out if r and r["score"] >= thresh]
-                if not cand:
-                    return
-                best = max(cand, key=lambda x: x["score"])
-
-                if pair in seen_symbol:
-                    return
-                seen_symbol.add(pair)
+                if cand:
+                    found.setdefault(pair, max(cand, key=lambda x: x["score"]))
+        finally:
+            report(1)
+
+    await asyncio.gather(*(analyze_pair(pair, p, v, s) for pair, p, v, s in valid_pairs))
+    return rank_results(list(found.values()))
+
+def shard_of(symbol: str, n_shards: int) -> int:
+    # crc32 stabil antar proses (hash() str di-random per proses)
+    return zlib.crc32(symbol.encode()) % n_shards
+
+_WORKER: Dict = {}
+
+def _worker_init(http_concurrency: int):
+    """Dijalankan sekali di tiap proses worker: event loop, session & cache milik shard."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def _open() -> BinanceClient:
+        session = aiohttp.ClientSession(headers={"User-Agent": "SignalBot/1.0"})
+        return BinanceClient(session, asyncio.Semaphore(http_concurrency))
+
+    _WORKER["loop"] = loop
+    _WORKER["client"] = loop.run_until_complete(_open())
+
+def _worker_scan(valid_pairs: List[Tuple[str, float, float, float]], strategy_name: str,
+                 mode_profile: str, btc_regime: str) -> List[Dict]:
+    # cache dikosongkan tiap scan supaya sama dgn jalur in-process (client baru per scan):
+    # klines & exchangeInfo selalu fresh; session HTTP & state indikator tetap dipakai ulang
+    _WORKER["client"].clear_cache()
+    return _WORKER["loop"].run_until_complete(
+        scan_universe(_WORKER["client"], valid_pairs, strategy_name, mode_profile, btc_regime)
+    )
 
-                msg = build_message(strategy_name, mode_profile, btc_regime, best)
-                messages.append((pair, msg))
+class ShardedScanner:
+    """Koordinator: universe di-partisi (hash) ke N proses worker, hasil di-merge by score.
+
+    Tiap shard selalu ke proses yang sama (executor 1 worker per shard), jadi
+    session HTTP & state indikator shard tetap hidup antar scan (cache HTTP
+    dikosongkan per scan, sama seperti jalur in-process). Worker yang mati
+    diganti executor baru dan shard-nya dipindai in-process utk scan itu;
+    worker pengganti membangun ulang state indikator dari window klines.
+    Semua worker berbagi IP yang sama, jadi HTTP_CONCURRENCY dibagi rata antar
+    worker (bukan dikali). Worker hanya kenal strategi dari STRATEGY_SPECS
+    (di-import ulang saat spawn); strategi dari register_strategy() saat runtime
+    dijalankan in-process oleh run_scan.
+    """
+    def __init__(self, n_workers: int):
+        self.per_worker = max(1, HTTP_CONCURRENCY // n_workers)
+        self.pools = [self._new_pool() for _ in range(n_workers)]
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        mp_ctx = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=1, mp_context=mp_ctx, initializer=_worker_init, initargs=(self.per_worker,))
+
+    async def warmup(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(p, os.getpid) for p in self.pools))
+
+    def supports(self, strategy_name: str) -> bool:
+        return strategy_name in STRATEGY_SPECS
+
+    async def scan(self, client: BinanceClient, valid_pairs: List[Tuple[str, float, float, float]],
+                   strategy_name: str, mode_profile: str, btc_regime: str, on_done=None) -> List[Dict]:
+        """`client` milik koordinator, dipakai sbg fallback in-process bila worker shard mati."""
+        shards: List[List[Tuple[str, float, float, float]]] = [[] for _ in self.pools]
+        for row in valid_pairs:
+            shards[shard_of(row[0], len(self.pools))].append(row)
+        loop = asyncio.get_running_loop()
+
+        async def run(i: int) -> List[Dict]:
+            if not shards[i]: return []
+            pool = self.pools[i]
+            try:
+                out = await loop.run_in_executor(pool, _worker_scan, shards[i], strategy_name, mode_profile, btc_regime)
+            except BrokenProcessPool:
+                log.warning(f"worker shard {i} mati; executor dibuat ulang, shard dipindai in-process")
+                if self.pools[i] is pool:  # scan paralel lain mungkin sudah menggantinya
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pools[i] = self._new_pool()
+                return await scan_universe(client, shards[i], strategy_name, mode_profile, btc_regime, on_done)
+            if on_done: on_done(len(shards[i]))
+            return out
+
+        parts = await asyncio.gather(*(run(i) for i in range(len(self.pools))))
+        return rank_results([r for part in parts for r in part])
+
+    def shutdown(self):
+        for p in self.pools:
+            p.shutdown(wait=False, cancel_futures=True)
+
+async def run_scan(update: Update, context: ContextTypes.DEFAULT_TYPE, strategy_name: str, mode_profile: str="retail", progress=None):
+    pairs = [p for p in PAIRS if cooldown_ok(p, strategy_name)]
+    scanner: Optional[ShardedScanner] = context.application.bot_data.get("scanner")
+    done = [0]
+
+    def on_done(n: int):
+        done[0] += n
+
+    async def report_progress():
+        last = -1
+        while True:
+            await asyncio.sleep(PROGRESS_EDIT_SEC)
+            if done[0] != last:
+                last = done[0]
+                await tg_edit(progress, f"🔍 [{mode_profile.upper()}] {strategy_name}: {last}/{len(pairs)} pair dianalisa...")
 
-        await asyncio.gather(*(analyze_pair(pair, p, v, s) for pair, p, v, s in valid_pairs))
+    async with aiohttp.ClientSession(headers={"User-Agent": "SignalBot/1.0"}) as session:
+        client = BinanceClient(session, asyncio.Semaphore(HTTP_CONCURRENCY))
+        btc_regime = await btc_regime_combo(client)
 
-    if not messages:
-        await update.message.reply_text("⚠️ Tidak ada sinyal layak saat ini. Coba di waktu lain.")
+        reporter = asyncio.create_task(report_progress()) if progress else None
+        try:
+            valid_pairs = await market_snapshot(client, pairs, strategy_name)
+            on_done(len(pairs) - len(valid_pairs))
+            if scanner and scanner.supports(strategy_name):
+                ranked = await scanner.scan(client, valid_pairs, strategy_name, mode_profile, btc_regime, on_done)
+            else:
+                ranked = await scan_universe(client, valid_pairs, strategy_name, mode_profile, btc_regime, on_done)
+        except Exception as e:
+            if reporter: reporter.cancel()  # jangan sampai edit progres menimpa pesan gagal
+            log.warning(f"scan {strategy_name} {mode_profile} gagal: {e}")
+            txt = "❌ Scan gagal (data market tidak tersedia). Coba lagi beberapa saat lagi."
+            if progress: await tg_edit(progress, txt)
+            else: await reply(update, txt)
+            return
+        finally:
+            if reporter: reporter.cancel()
+
+    chat_id = update.effective_chat.id
+    # reservasi cooldown sebelum await apapun: scan paralel utk strategi yg sama
+    # (user lain / double tap) tidak akan mengirim symbol yang sama
+    ranked = [r for r in ranked if cooldown_ok(r["symbol"], strategy_name)][:MAX_SIGNALS]
+    reserved = [mark_sent(r["symbol"], strategy_name) for r in ranked]
+    if not ranked:
+        txt = "⚠️ Tidak ada sinyal layak saat ini. Coba di waktu lain."
+        if progress: await tg_edit(progress, txt)
+        else: await reply(update, txt)
         return
 
-    messages = messages[:MAX_SIGNALS]
-    for pair, msg in messages:
-        await update.message.reply_text(msg, parse_mode="HTML")
-        mark_sent(pair, strategy_name)
-        await asyncio.sleep(0.4)
+    messages = [build_message(strategy_name, mode_profile, btc_regime, best) for best in ranked]
+    groups = pack_messages(messages) if progress else [[i] for i in range(len(messages))]
+    delivered = 0
+    try:
+        for group in groups:
+            text = "\n\n".join(messages[i] for i in group)
+            if progress: await tg_send(context.bot, chat_id, text, parse_mode="HTML")
+            else: await reply(update, text, parse_mode="HTML")
+            # register segera setelah terkirim, agar kegagalan pesan berikutnya tidak menghilangkannya
+            for i in group:
+                TRACKER.register(chat_id, strategy_name, mode_profile, ranked[i])
+            delivered += len(group)
+    except Exception:
+        for r, ts in zip(ranked[delivered:], reserved[delivered:]):
+            release_sent(r["symbol"], strategy_name, ts)
+        raise
 
-    await update.message.reply_text(f"✅ Scan selesai. Ditemukan {len(messages)} sinyal.")
+    summary = f"✅ Scan selesai. Ditemukan {len(ranked)} sinyal."
+    if progress: await tg_edit(progress, summary)
+    else: await reply(update, summary)
 
 async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
     err = "".join(traceback.format_exception(None, context.error, context.error.__traceback__))[:1500]
@@ -756,21 +1411,77 @@ async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
     try:
         owner = ALLOWED_USERS[0] if ALLOWED_USERS else None
         if owner:
-            await context.bot.send_message(owner, f"⚠️ Bot error:\n{err}")
+            await tg_send(context.bot, owner, f"⚠️ Bot error:\n{err}")
     except Exception:
         pass
 
+async def serve_webhook_unregistered(app):
+    """Webhook tanpa setWebhook: terima payload Update (mis. rekaman) di PORT/WEBHOOK_PATH.
+
+    Tidak ada bootstrap ke Telegram (tanpa setWebhook / drop_pending_updates),
+    jadi webhook & antrian update bot live aman. Balasan tetap lewat Bot API.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), app.bot)
+        except Exception as e:
+            log.info(f"payload webhook tidak valid: {e}")
+            return web.Response(status=400)
+        await app.update_queue.put(update)
+        return web.Response()
+
+    web_app = web.Application()
+    web_app.router.add_post(f"/{WEBHOOK_PATH}", handle)
+    runner = web.AppRunner(web_app)
+    async with app:
+        await post_startup(app)
+        await app.start()
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", PORT).start()
+        log.warning(f"Webhook lokal (tanpa setWebhook) di :{PORT}/{WEBHOOK_PATH}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await app.stop()
+            await post_shutdown(app)
+
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    builder = ApplicationBuilder().token(BOT_TOKEN).concurrent_updates(UPDATE_CONCURRENCY)
+    if BOT_MODE == "webhook" and not WEBHOOK_REGISTER:
+        builder = builder.updater(None)  # update dimasukkan sendiri ke update_queue
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_cmd))
     app.add_handler(CommandHandler("info", info_cmd))
-    app.add_handler(CommandHandler("ping", lambda u,c: u.message.reply_text("pong ✅", reply_markup=kb_main())))
+    app.add_handler(CommandHandler("stats", stats_cmd))
+    app.add_handler(CommandHandler("ping", lambda u,c: reply(u, "pong ✅", reply_markup=kb_main())))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_error_handler(on_error)
     app.post_init = post_startup
-    log.info("Enhanced bot aktif dan berjalan…")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    app.post_shutdown = post_shutdown
+    log.info(f"Enhanced bot aktif dan berjalan… (mode {BOT_MODE})")
+    if BOT_MODE == "webhook" and not WEBHOOK_REGISTER:
+        try:
+            asyncio.run(serve_webhook_unregistered(app))
+        except KeyboardInterrupt:
+            pass
+    elif BOT_MODE == "webhook":
+        # server webhook bawaan PTB; Telegram mengirim header X-Telegram-Bot-Api-Secret-Token
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=UPDATE_CONCURRENCY,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True,
+        )
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()